@@ -1,114 +1,234 @@
 import os
-import base64
+import asyncio
+import functools
+import glob
+import hashlib
+import pybase64
 import sqlite3
-from flask import Flask, render_template, request, jsonify, send_file, g, url_for
+import tempfile
+import threading
+from quart import Quart, render_template, stream_template, request, jsonify, send_file, url_for
+import numpy as np
 import qrcode
-from PIL import Image, ImageDraw, ImageFont
+# Deploy with pillow-simd (API-compatible, CC="cc -mavx2") for SIMD resizes
+from PIL import Image, ImageDraw, ImageFont, ImageOps
 from io import BytesIO
 import time
 
-app = Flask(__name__)
+app = Quart(__name__)
 
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "static", "uploads")
 DB_PATH = os.path.join(os.path.dirname(__file__), "students.db")
 
+# Rendered cards hold student data; keep them out of static/ so they are
+# only reachable through the export routes
+CARD_FOLDER = os.path.join(os.path.dirname(__file__), "cards")
+
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(CARD_FOLDER, exist_ok=True)
 
 # ---------------------------
 # DATABASE FUNCTIONS
 # ---------------------------
+INSERT_SQL = """
+    INSERT INTO students (idno, lastname, firstname, course, level, photo_path, qr_path, qr_matrix, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
+"""
+
+# One connection per worker process. Handlers all run on the event loop
+# thread, so it is never used concurrently.
+_db = None
+
 def get_db():
-    if "db" not in g:
-        g.db = sqlite3.connect(DB_PATH)
-        g.db.row_factory = sqlite3.Row
-    return g.db
-
-@app.before_request
-def init_db_once():
-    if not hasattr(g, "db_initialized"):
-        db = get_db()
-        db.execute("""
-            CREATE TABLE IF NOT EXISTS students (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                idno TEXT,
-                lastname TEXT,
-                firstname TEXT,
-                course TEXT,
-                level TEXT,
-                photo_path TEXT,
-                qr_path TEXT,
-                created_at TEXT
-            )
-        """)
-        db.commit()
-        g.db_initialized = True
-
-@app.teardown_appcontext
-def close_db(error):
-    if "db" in g:
-        g.db.close()
+    global _db
+    if _db is None:
+        _db = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+        _db.row_factory = sqlite3.Row
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute("PRAGMA synchronous=NORMAL")
+        _db.execute("PRAGMA cache_size=-65536")
+    return _db
+
+@app.before_serving
+async def init_db():
+    db = get_db()
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idno TEXT,
+            lastname TEXT,
+            firstname TEXT,
+            course TEXT,
+            level TEXT,
+            photo_path TEXT,
+            qr_path TEXT,
+            created_at TEXT,
+            qr_matrix BLOB
+        )
+    """)
+    columns = {row["name"] for row in db.execute("PRAGMA table_info(students)")}
+    if "qr_matrix" not in columns:
+        # Other worker processes may be running this same migration
+        try:
+            db.execute("ALTER TABLE students ADD COLUMN qr_matrix BLOB")
+        except sqlite3.OperationalError as e:
+            if "duplicate column name" not in str(e):
+                raise
+    db.execute("CREATE INDEX IF NOT EXISTS ix_students_idno ON students(idno)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_students_created ON students(created_at DESC)")
+    db.commit()
+
+@app.after_serving
+async def close_db():
+    global _db
+    if _db is not None:
+        _db.close()
+        _db = None
 
 
 # ---------------------------
 # MAIN PAGE
 # ---------------------------
 @app.route("/")
-def index():
+async def index():
     courses = ["BSIT", "BSCS", "BSIS", "BSHM", "BSA", "BSBA"]
     levels = ["1", "2", "3", "4"]
-    return render_template("index.html", courses=courses, levels=levels)
+    return await render_template("index.html", courses=courses, levels=levels)
 
 
 # ---------------------------
 # SAVE STUDENT
 # ---------------------------
+def write_file(path, data):
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+    fd = os.open(path, flags, 0o644)
+    try:
+        if hasattr(os, "posix_fallocate") and len(data):
+            os.posix_fallocate(fd, 0, len(data))
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+PHOTO_SIZE = 320
+QR_BOX_SIZE = 10
+
+
+def shrink_photo(image_data):
+    """Re-encode an upload at card resolution, without EXIF."""
+    img = Image.open(BytesIO(image_data))
+    img.draft("RGB", (PHOTO_SIZE, PHOTO_SIZE))
+    img = ImageOps.exif_transpose(img).convert("RGB")
+
+    # Keep the aspect ratio; the short side only needs to cover the card
+    scale = PHOTO_SIZE / min(img.size)
+    if scale < 1:
+        img = img.resize((round(img.width * scale), round(img.height * scale)))
+
+    # Saving without exif= drops the metadata
+    bio = BytesIO()
+    img.save(bio, "JPEG", quality=88, optimize=True)
+    return bio.getbuffer()
+
+
+# One QRCode per worker thread, cleared between saves instead of rebuilt
+_qr_local = threading.local()
+
+def get_qr():
+    qr_obj = getattr(_qr_local, "qr", None)
+    if qr_obj is None:
+        qr_obj = _qr_local.qr = qrcode.QRCode(version=1, box_size=QR_BOX_SIZE, border=2)
+    else:
+        qr_obj.clear()
+        qr_obj.version = 1
+    return qr_obj
+
+
+def pack_qr_matrix(matrix):
+    """Side length as 2 bytes, then the modules row-major, 1 bit each."""
+    size = len(matrix)
+    bits = np.packbits(np.asarray(matrix, dtype=np.uint8))
+    return size.to_bytes(2, "big") + bits.tobytes()
+
+
+def unpack_qr_matrix(blob):
+    size = int.from_bytes(blob[:2], "big")
+    bits = np.unpackbits(np.frombuffer(blob, np.uint8, offset=2), count=size * size)
+    return bits.reshape(size, size)
+
+
+def qr_image(matrix):
+    # Paint the module matrix 1px per module and scale up, instead of
+    # letting PilImage draw a rectangle per module
+    img = Image.fromarray(~np.asarray(matrix, dtype=bool))
+    scaled = img.width * QR_BOX_SIZE
+    return img.resize((scaled, scaled), Image.NEAREST)
+
+
+def generate_qr(value, qr_path):
+    qr_obj = get_qr()
+    qr_obj.add_data(value)
+    qr_obj.make(fit=True)
+    matrix = qr_obj.get_matrix()
+
+    # Tiny 1-bit image: fast zlib level is plenty, and write the
+    # BytesIO buffer straight out without a getvalue() copy
+    bio = BytesIO()
+    qr_image(matrix).save(bio, "PNG", optimize=False, compress_level=1)
+    write_file(qr_path, bio.getbuffer())
+
+    return pack_qr_matrix(matrix)
+
+
 @app.route("/save", methods=["POST"])
-def save_student():
-    data = request.get_json(force=True)
+async def save_student():
+    data = await request.form
+    files = await request.files
 
     idno = data.get("idno", "").strip()
     lastname = data.get("lastname", "").strip()
     firstname = data.get("firstname", "").strip()
     course = data.get("course", "").strip()
     level = data.get("level", "").strip()
-    photo_b64 = data.get("photo_data")
+
+    # Data URI arrives as a raw file part so it can be sliced without copies
+    photo_file = files.get("photo_data")
+    photo_b64 = photo_file.read() if photo_file else b""
 
     if not (idno and lastname and firstname and course and level):
         return jsonify({"status": "error", "msg": "Missing fields"}), 400
 
-    if not photo_b64 or "," not in photo_b64:
+    # The "data:image/...;base64," header is short; never scan the payload
+    comma = photo_b64.find(b",", 5, 64) if photo_b64.startswith(b"data:") else -1
+    if comma < 0:
         return jsonify({"status": "error", "msg": "Invalid or missing photo"}), 400
 
     try:
-        header, encoded = photo_b64.split(",", 1)
-        image_data = base64.b64decode(encoded)
+        image_data = pybase64.b64decode(memoryview(photo_b64)[comma + 1:], validate=False)
+        photo_data = await asyncio.to_thread(shrink_photo, image_data)
     except Exception as e:
         return jsonify({"status": "error", "msg": "Image decode failed", "error": str(e)}), 400
 
-    photo_filename = f"{idno}_photo_{int(time.time())}.jpg"
+    ts = time.time_ns() // 1_000_000_000
+    photo_filename = f"{idno}_photo_{ts}.jpg"
     photo_path = os.path.join(UPLOAD_FOLDER, photo_filename)
-    with open(photo_path, "wb") as f:
-        f.write(image_data)
+    await asyncio.to_thread(write_file, photo_path, photo_data)
 
     # ---------------------------
     # QR GENERATION
     # ---------------------------
     qr_url_value = url_for("view_student", idno=idno, _external=True)
-    qr_filename = f"{idno}_qr_{int(time.time())}.png"
+    qr_filename = f"{idno}_qr_{ts}.png"
     qr_path = os.path.join(UPLOAD_FOLDER, qr_filename)
 
-    qr_obj = qrcode.QRCode(version=1, box_size=10, border=2)
-    qr_obj.add_data(qr_url_value)
-    qr_obj.make(fit=True)
-    img = qr_obj.make_image(fill_color="black", back_color="white")
-    img.save(qr_path)
+    qr_matrix = await asyncio.to_thread(generate_qr, qr_url_value, qr_path)
 
     # Save record
     db = get_db()
-    cur = db.execute("""
-        INSERT INTO students (idno, lastname, firstname, course, level, photo_path, qr_path, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))
-    """, (idno, lastname, firstname, course, level, photo_filename, qr_filename))
+    cur = db.cursor()
+    cur.execute(INSERT_SQL, (idno, lastname, firstname, course, level, photo_filename, qr_filename, qr_matrix))
     db.commit()
 
     student_id = cur.lastrowid
@@ -124,73 +244,257 @@ def save_student():
 # STUDENT VIEWER (QR OPENS HERE)
 # ---------------------------
 @app.route("/student/<idno>")
-def view_student(idno):
+async def view_student(idno):
     db = get_db()
     student = db.execute("SELECT * FROM students WHERE idno=?", (idno,)).fetchone()
 
     if not student:
         return f"<h1>Student with ID {idno} not found.</h1>"
 
-    return render_template("student_view.html", student=student)
+    return await render_template("student_view.html", student=student)
+
+
+# ---------------------------
+# ID CARD TEMPLATE
+# ---------------------------
+CARD_WIDTH, CARD_HEIGHT = 1100, 650
+
+# Load fonts
+try:
+    TITLE_FONT = ImageFont.truetype("arialbd.ttf", 40)
+    LABEL_FONT = ImageFont.truetype("arialbd.ttf", 26)
+    VALUE_FONT = ImageFont.truetype("arial.ttf", 26)
+    FOOTER_FONT = ImageFont.truetype("arial.ttf", 20)
+except:
+    TITLE_FONT = LABEL_FONT = VALUE_FONT = FOOTER_FONT = ImageFont.load_default()
+
+
+def load_static_image(filename, size):
+    path = os.path.join("static", filename)
+    if not os.path.exists(path):
+        return None
+    with Image.open(path) as img:
+        return img.resize(size).convert("RGB")
+
+
+DETAIL_LABELS = "IDNO:\nLASTNAME:\nFIRSTNAME:\nPROGRAM:\nYEAR LEVEL:"
+
+
+@functools.cache
+def line_height(font):
+    return font.getbbox("A")[3]
+
+
+LOGO_IMG = load_static_image("school_logo.png", (80, 80))
+SEAL_IMG = load_static_image("seal.png", (120, 120))
+
+
+def build_card_template():
+    WIDTH, HEIGHT = CARD_WIDTH, CARD_HEIGHT
+    canvas = np.full((HEIGHT, WIDTH, 3), 255, np.uint8)
+
+    # HEADER BAR
+    header_color = (25, 55, 130)  # Navy blue
+    canvas[0:101] = header_color
+
+    # SCHOOL LOGO (Optional)
+    if LOGO_IMG is not None:
+        canvas[10:90, 30:110] = np.asarray(LOGO_IMG)
+
+    # SEAL (Optional)
+    if SEAL_IMG is not None:
+        canvas[HEIGHT - 190:HEIGHT - 70, WIDTH - 180:WIDTH - 60] = np.asarray(SEAL_IMG)
+
+    card = Image.fromarray(canvas)
+    draw = ImageDraw.Draw(card)
+
+    # HEADER TEXT
+    draw.text((150, 25), "UNIVERSITY STUDENT ID CARD", fill="white", font=TITLE_FONT)
+
+    # SIGNATURE
+    draw.line([(50, HEIGHT - 150), (350, HEIGHT - 150)], fill="black", width=2)
+    draw.text((50, HEIGHT - 140), "Registrar Signature", fill="black", font=VALUE_FONT)
+
+    # Validity
+    draw.text((400, HEIGHT - 130), "VALID UNTIL: 2026", fill="black", font=LABEL_FONT)
+
+    # FOOTER
+    draw.text((50, HEIGHT - 40), "Copyright © Karl Gaviola, 2025",
+              fill="black", font=FOOTER_FONT)
+
+    return np.asarray(card)
+
+
+CARD_TEMPLATE = build_card_template()
+
+# Bump when draw_idcard's layout changes; template edits (text, fonts,
+# logo/seal) are picked up through the digest automatically
+CARD_VERSION = 1
+CARD_TEMPLATE_DIGEST = hashlib.sha1(CARD_TEMPLATE.tobytes()).hexdigest()
 
 
 # ---------------------------
 # EXPORT FUNCTIONS
 # ---------------------------
-def generate_idcard(student_id):
+EXPORT_WORKERS = 2
+
+# Jobs are (student, fmt, future); in-flight futures are shared so
+# concurrent exports of the same card only render it once. The queue is
+# created per serving loop, since asyncio.Queue binds to the first loop
+# that uses it.
+_export_queue = None
+_export_jobs = {}
+_export_tasks = []
+
+
+async def export_worker():
+    while True:
+        student, fmt, future = await _export_queue.get()
+        try:
+            path = await asyncio.to_thread(write_card, student, fmt)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(path)
+        finally:
+            _export_queue.task_done()
+
+
+@app.before_serving
+async def start_export_workers():
+    global _export_queue
+    _export_queue = asyncio.Queue()
+    for _ in range(EXPORT_WORKERS):
+        _export_tasks.append(asyncio.create_task(export_worker()))
+
+
+@app.after_serving
+async def stop_export_workers():
+    global _export_queue
+    for task in _export_tasks:
+        task.cancel()
+    await asyncio.gather(*_export_tasks, return_exceptions=True)
+    _export_tasks.clear()
+
+    # Nothing will finish queued jobs now; release anyone still waiting
+    for future in list(_export_jobs.values()):
+        future.cancel()
+    _export_jobs.clear()
+    _export_queue = None
+
+
+async def export_card(student_id, fmt):
     db = get_db()
     student = db.execute("SELECT * FROM students WHERE id=?", (student_id,)).fetchone()
     if not student:
         return None
 
-    # Paths
-    photo_path = os.path.join(UPLOAD_FOLDER, student["photo_path"])
-    qr_path = os.path.join(UPLOAD_FOLDER, student["qr_path"])
+    # The filename carries a digest of the row and the card template, so a
+    # new or edited record, or a changed template, misses the disk cache
+    path = card_path(student, fmt)
+    if os.path.exists(path):
+        return path
 
-    # Load images
-    photo = Image.open(photo_path).convert("RGB")
-    qr = Image.open(qr_path).convert("RGB")
+    future = _export_jobs.get(path)
+    if future is None:
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda _: _export_jobs.pop(path, None))
+        _export_jobs[path] = future
+        await _export_queue.put((student, fmt, future))
 
-    # ID CARD SIZE
-    WIDTH, HEIGHT = 1100, 650
-    card = Image.new("RGB", (WIDTH, HEIGHT), "white")
-    draw = ImageDraw.Draw(card)
+    # Shield so a client disconnect doesn't cancel a job others may share
+    return await asyncio.shield(future)
+
+
+def card_digest(student):
+    key = f"{CARD_VERSION}:{CARD_TEMPLATE_DIGEST}:{tuple(student)!r}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def card_path(student, fmt):
+    return os.path.join(CARD_FOLDER, f"idcard_{student['id']}_{card_digest(student)}.{fmt}")
+
+
+def write_card(student, fmt):
+    data, size = render_idcard(student)
+    card = Image.frombytes("RGB", size, data)
 
-    # Load fonts
+    if fmt == "pdf":
+        bio = encode_pdf(card)
+    else:
+        bio = BytesIO()
+        card.save(bio, "PNG")
+
+    # Write to a temp file unique to this writer, then rename, so readers
+    # never see a half-written card even with several worker processes
+    path = card_path(student, fmt)
+    fd, tmp_path = tempfile.mkstemp(dir=CARD_FOLDER, suffix=".tmp")
+    os.close(fd)
     try:
-        title_font = ImageFont.truetype("arialbd.ttf", 40)
-        label_font = ImageFont.truetype("arialbd.ttf", 26)
-        value_font = ImageFont.truetype("arial.ttf", 26)
-        footer_font = ImageFont.truetype("arial.ttf", 20)
-    except:
-        title_font = label_font = value_font = footer_font = ImageFont.load_default()
+        write_file(tmp_path, bio.getbuffer())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    # Drop cards rendered from an older version of this record or template
+    for old_path in glob.glob(os.path.join(CARD_FOLDER, f"idcard_{student['id']}_*.{fmt}")):
+        if old_path != path:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+    return path
+
+
+# Keyed on the whole row, like the files in CARD_FOLDER, so an edited record
+# misses instead of going stale. The template is fixed for the life of the
+# process. Finished cards live on disk; this only spares a re-render when
+# the other format of a recent card is requested. Raw RGB is ~2MB per card.
+@functools.lru_cache(maxsize=4)
+def render_idcard(student):
+    card = draw_idcard(student)
+    return card.tobytes(), card.size
+
+
+def draw_idcard(student):
+    # Paths
+    photo_path = os.path.join(UPLOAD_FOLDER, student["photo_path"])
+    qr_path = os.path.join(UPLOAD_FOLDER, student["qr_path"])
 
-    # ---------------------------
-    # HEADER BAR
-    # ---------------------------
-    header_color = (25, 55, 130)  # Navy blue
-    draw.rectangle([(0, 0), (WIDTH, 100)], fill=header_color)
+    # Load images; rebuild the QR from its stored modules when we have
+    # them, older rows only have the PNG
+    photo = Image.open(photo_path)
+    # Let libjpeg downscale during DCT decode (no-op for other formats);
+    # it never drops below the requested 300x300 card size
+    photo.draft("RGB", (300, 300))
+    photo = photo.convert("RGB")
+    if student["qr_matrix"]:
+        qr = qr_image(unpack_qr_matrix(student["qr_matrix"])).convert("RGB")
+    else:
+        qr = Image.open(qr_path).convert("RGB")
 
-    # SCHOOL LOGO (Optional)
-    logo_path = os.path.join("static", "school_logo.png")
-    if os.path.exists(logo_path):
-        logo = Image.open(logo_path).resize((80, 80))
-        card.paste(logo, (30, 10))
+    WIDTH = CARD_WIDTH
 
-    # HEADER TEXT
-    draw.text((150, 25), "UNIVERSITY STUDENT ID CARD", fill="white", font=title_font)
+    # Only the per-student pictures go onto a copy of the static card
+    canvas = CARD_TEMPLATE.copy()
 
     # ---------------------------
     # STUDENT PHOTO
     # ---------------------------
-    photo = photo.resize((300, 300))
-    card.paste(photo, (50, 150))
+    photo = photo.resize((300, 300), Image.BILINEAR)
+    canvas[150:450, 50:350] = np.asarray(photo)
 
     # ---------------------------
     # QR CODE
     # ---------------------------
-    qr = qr.resize((220, 220))
-    card.paste(qr, (WIDTH - 270, 150))
+    qr = qr.resize((220, 220), Image.BILINEAR)
+    canvas[150:370, WIDTH - 270:WIDTH - 50] = np.asarray(qr)
+
+    card = Image.fromarray(canvas)
+    draw = ImageDraw.Draw(card)
 
     # ---------------------------
     # STUDENT DETAILS (CENTER)
@@ -199,77 +503,102 @@ def generate_idcard(student_id):
     details_y = 160
     spacing = 55
 
-    info = [
-        ("IDNO:", student["idno"]),
-        ("LASTNAME:", student["lastname"]),
-        ("FIRSTNAME:", student["firstname"]),
-        ("PROGRAM:", student["course"]),
-        ("YEAR LEVEL:", student["level"]),
-    ]
-
-    for label, value in info:
-        draw.text((details_x, details_y), label, fill="black", font=label_font)
-        draw.text((details_x + 220, details_y), str(value), fill="black", font=value_font)
-        details_y += spacing
+    values = "\n".join(str(student[key]) for key in ("idno", "lastname", "firstname", "course", "level"))
 
-    # ---------------------------
-    # SIGNATURE & SEAL SECTION
-    # ---------------------------
-    draw.line([(50, HEIGHT - 150), (350, HEIGHT - 150)], fill="black", width=2)
-    draw.text((50, HEIGHT - 140), "Registrar Signature", fill="black", font=value_font)
+    # One multiline call per font instead of a draw.text per cell; Pillow
+    # advances each line by the font's "A" height plus spacing
+    draw.multiline_text((details_x, details_y), DETAIL_LABELS, fill="black",
+                        font=LABEL_FONT, spacing=spacing - line_height(LABEL_FONT))
+    draw.multiline_text((details_x + 220, details_y), values, fill="black",
+                        font=VALUE_FONT, spacing=spacing - line_height(VALUE_FONT))
 
-    seal_path = os.path.join("static", "seal.png")
-    if os.path.exists(seal_path):
-        seal = Image.open(seal_path).resize((120, 120))
-        card.paste(seal, (WIDTH - 180, HEIGHT - 190))
+    return card
 
-    # Validity
-    draw.text((400, HEIGHT - 130), "VALID UNTIL: 2026", fill="black", font=label_font)
 
-    # ---------------------------
-    # FOOTER
-    # ---------------------------
-    draw.text((50, HEIGHT - 40), "Copyright © Karl Gaviola, 2025",
-              fill="black", font=footer_font)
-
-    return card
 
+def jpeg_to_pdf(jpeg_data, width, height):
+    """Wrap already-encoded JPEG bytes in a one-page PDF (DCTDecode, no re-encode)."""
+    out = BytesIO()
+    offsets = []
+
+    def write_obj(body, stream=None):
+        offsets.append(out.tell())
+        out.write(f"{len(offsets)} 0 obj\n".encode())
+        out.write(body)
+        if stream is not None:
+            out.write(b"\nstream\n")
+            out.write(stream)
+            out.write(b"\nendstream")
+        out.write(b"\nendobj\n")
+
+    content = f"q {width} 0 0 {height} 0 0 cm /Im0 Do Q".encode()
+
+    out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    write_obj(b"<< /Type /Catalog /Pages 2 0 R >>")
+    write_obj(b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>")
+    write_obj(
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+        f"/Resources << /XObject << /Im0 4 0 R >> >> /Contents 5 0 R >>".encode()
+    )
+    write_obj(
+        f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+        f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode "
+        f"/Length {len(jpeg_data)} >>".encode(),
+        jpeg_data,
+    )
+    write_obj(f"<< /Length {len(content)} >>".encode(), content)
+
+    xref = out.tell()
+    out.write(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(
+        f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n".encode()
+    )
+    out.seek(0)
+    return out
+
+
+def encode_pdf(card):
+    jpg = BytesIO()
+    card.save(jpg, "JPEG", quality=85, optimize=True)
+    return jpeg_to_pdf(jpg.getbuffer(), *card.size)
 
 
 @app.route("/export/png/<int:student_id>")
-def export_png(student_id):
-    card = generate_idcard(student_id)
-    if not card:
+async def export_png(student_id):
+    path = await export_card(student_id, "png")
+    if not path:
         return "Student not found", 404
-    bio = BytesIO()
-    card.save(bio, "PNG")
-    bio.seek(0)
-    return send_file(bio, mimetype="image/png", as_attachment=True, download_name=f"idcard_{student_id}.png")
+    return await send_file(path, mimetype="image/png", as_attachment=True, attachment_filename=f"idcard_{student_id}.png")
 
 
 @app.route("/export/pdf/<int:student_id>")
-def export_pdf(student_id):
-    card = generate_idcard(student_id)
-    if not card:
+async def export_pdf(student_id):
+    path = await export_card(student_id, "pdf")
+    if not path:
         return "Student not found", 404
-    bio = BytesIO()
-    card.save(bio, "PDF")
-    bio.seek(0)
-    return send_file(bio, mimetype="application/pdf", as_attachment=True, download_name=f"idcard_{student_id}.pdf")
+    return await send_file(path, mimetype="application/pdf", as_attachment=True, attachment_filename=f"idcard_{student_id}.pdf")
 
 
 # ---------------------------
 # RECORDS PAGE
 # ---------------------------
 @app.route("/records")
-def records():
+async def records():
     db = get_db()
-    rows = db.execute("SELECT * FROM students ORDER BY created_at DESC").fetchall()
-    return render_template("records.html", students=rows)
+    # Hand the cursor to the template so rows are fetched as they render
+    rows = db.execute("""
+        SELECT id, idno, lastname, firstname, course, level, photo_path, qr_path
+        FROM students ORDER BY created_at DESC
+    """)
+    return app.response_class(await stream_template("records.html", students=rows))
 
 
 # ---------------------------
 # RUN SERVER
 # ---------------------------
+# Production: uvicorn student:app --workers 4
 if __name__ == "__main__":
     app.run(debug=True)